@@ -0,0 +1,165 @@
+import duckdb
+import hashlib
+import inspect
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+# File-backed so unchanged payloads are not re-ingested on every run
+DB_FILE = Path("data") / "analytics.duckdb"
+
+# The overview payloads are a single JSON document, larger than DuckDB's
+# default 16MB object limit
+MAX_OBJECT_SIZE = 256 * 1024 * 1024
+
+# Only the columns the analyses touch are materialized; the raw payloads
+# carry dozens of nested, loosely typed fields we never read and that
+# read_json skips when an explicit column list is given.
+PROTOCOLS_COLUMNS = {
+    "id": "VARCHAR",
+    "name": "VARCHAR",
+    "category": "VARCHAR",
+    "chain": "VARCHAR",
+    "tvl": "DOUBLE",
+    "mcap": "DOUBLE",
+}
+
+# Fees and revenue come from the same overview endpoint and share a shape
+OVERVIEW_COLUMNS = {
+    "id": "VARCHAR",
+    "name": "VARCHAR",
+    "total24h": "DOUBLE",
+    "total7d": "DOUBLE",
+    "total30d": "DOUBLE",
+    "total1y": "DOUBLE",
+    "totalAllTime": "DOUBLE",
+}
+
+_con: Optional[duckdb.DuckDBPyConnection] = None
+
+def _struct_fields(columns: Dict[str, str]) -> str:
+    """Render a column mapping as the field list of a DuckDB STRUCT type."""
+    return ", ".join(f"{name} {type_}" for name, type_ in columns.items())
+
+def _column_spec(columns: Dict[str, str]) -> str:
+    """Render a column mapping as a read_json columns={...} literal."""
+    return "{" + ", ".join(f"'{name}': '{type_}'" for name, type_ in columns.items()) + "}"
+
+def _load_protocols(con: duckdb.DuckDBPyConnection, payload_file: Path):
+    """Materialize the protocols payload as a table."""
+    # DefiLlama ids are numeric strings; store them as BIGINT so the
+    # analyses join on an integer key. Non-numeric ids (e.g. "parent#..."
+    # aggregates) become NULL and never match, as before.
+    con.execute(f"""
+        CREATE OR REPLACE TABLE protocols AS 
+        SELECT * REPLACE (TRY_CAST(id AS BIGINT) as id)
+        FROM read_json(
+            '{payload_file}',
+            format = 'array',
+            columns = {_column_spec(PROTOCOLS_COLUMNS)}
+        )
+    """)
+
+def _load_overview(con: duckdb.DuckDBPyConnection, table: str, payload_file: Path):
+    """Materialize an overview payload (fees or revenue) as a table."""
+    con.execute(f"""
+        CREATE OR REPLACE TABLE {table} AS 
+        SELECT 
+            TRY_CAST(unnest.id AS BIGINT) as id,
+            unnest.name,
+            unnest.total24h as {table}_24h,
+            unnest.total7d as {table}_7d,
+            unnest.total30d as {table}_30d,
+            unnest.total1y as {table}_1y,
+            unnest.totalAllTime as {table}_all_time
+        FROM read_json(
+            '{payload_file}',
+            columns = {{'protocols': 'STRUCT({_struct_fields(OVERVIEW_COLUMNS)})[]'}},
+            maximum_object_size = {MAX_OBJECT_SIZE}
+        ) as o,
+        UNNEST(o.protocols) as unnest
+    """)
+
+# Stored next to each payload fingerprint; a table is only reused when both
+# its payload and the loader code and columns that built it are unchanged
+LOADER_VERSION = hashlib.sha256(
+    repr((
+        inspect.getsource(_load_protocols),
+        inspect.getsource(_load_overview),
+        PROTOCOLS_COLUMNS,
+        OVERVIEW_COLUMNS,
+    )).encode()
+).hexdigest()
+
+_LOADERS = {
+    "protocols": _load_protocols,
+    "fees": lambda con, payload_file: _load_overview(con, "fees", payload_file),
+    "revenue": lambda con, payload_file: _load_overview(con, "revenue", payload_file),
+}
+
+def open_con(payload_files: Dict[str, Path], database: Path = DB_FILE) -> duckdb.DuckDBPyConnection:
+    """Open the shared connection and load protocols/fees/revenue into it.
+    
+    Each endpoint's raw JSON file is fingerprinted; tables whose payload
+    hash and loader version match the ones stored in the database are
+    reused as is, and the rest are parsed straight from the file by
+    DuckDB's JSON reader.
+    """
+    global _con
+    if _con is not None:
+        # Reusing it would silently ignore these payloads and database
+        raise RuntimeError("The shared connection is already open; call close_con() first")
+    
+    con = duckdb.connect(str(database))
+    # Every analysis and export query sorts explicitly, so loads and
+    # scans don't need to keep row order
+    con.execute("SET preserve_insertion_order = false")
+    con.execute(f"SET threads = {os.cpu_count() or 1}")
+    con.execute("SET memory_limit = '4GB'")
+    con.execute("SET enable_object_cache = true")
+    
+    # Don't leave the database file locked if a load fails
+    try:
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                endpoint VARCHAR PRIMARY KEY,
+                sha256 VARCHAR,
+                loader_version VARCHAR,
+                loaded_at TIMESTAMP DEFAULT current_timestamp
+            )
+        """)
+        fingerprints = {
+            endpoint: (digest, loader_version)
+            for endpoint, digest, loader_version in con.execute(
+                "SELECT endpoint, sha256, loader_version FROM metadata"
+            ).fetchall()
+        }
+        
+        for endpoint, load in _LOADERS.items():
+            with open(payload_files[endpoint], "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if fingerprints.get(endpoint) == (digest, LOADER_VERSION):
+                continue
+            load(con, payload_files[endpoint])
+            con.execute(
+                "INSERT OR REPLACE INTO metadata (endpoint, sha256, loader_version, loaded_at) VALUES (?, ?, ?, current_timestamp)",
+                [endpoint, digest, LOADER_VERSION],
+            )
+    except Exception:
+        con.close()
+        raise
+    _con = con
+    return _con
+
+def get_con() -> duckdb.DuckDBPyConnection:
+    """Return the shared connection opened by open_con()."""
+    if _con is None:
+        raise RuntimeError("The shared connection is not open; call open_con() first")
+    return _con
+
+def close_con():
+    """Close the shared connection so open_con() can open it again."""
+    global _con
+    if _con is not None:
+        _con.close()
+        _con = None
@@ -0,0 +1,29 @@
+import pyarrow as pa
+from typing import Any
+
+def _format_cell(column: str, value: Any) -> str:
+    """Render a single result value for console output."""
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        # Ratios span many orders of magnitude, so keep significant digits
+        # rather than decimals; everything else is a dollar amount
+        return f"{value:.6g}" if column.endswith("_ratio") else f"{value:,.2f}"
+    return str(value)
+
+def print_table(table: pa.Table):
+    """Print an Arrow table as aligned columns without going through pandas."""
+    columns = table.column_names
+    rows = [[_format_cell(column, row[column]) for column in columns] for row in table.to_pylist()]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(columns)]
+    numeric = [pa.types.is_integer(t) or pa.types.is_floating(t) for t in table.schema.types]
+    
+    def justify(cells):
+        return "  ".join(
+            cell.rjust(width) if is_numeric else cell.ljust(width)
+            for cell, width, is_numeric in zip(cells, widths, numeric)
+        ).rstrip()
+    
+    print(justify(columns))
+    for row in rows:
+        print(justify(row))
@@ -1,79 +1,39 @@
 import duckdb
-from pathlib import Path
-import json
+import pyarrow.compute as pc
 from typing import Dict, Any
+from analysis._format import print_table
 
-def analyze_efficiency(data: Dict[str, Any], timeframes: list = ['24h', '7d', '30d', '1y']):
+def analyze_efficiency(con: duckdb.DuckDBPyConnection, timeframes: list = ['24h', '7d', '30d', '1y']):
     """Analyze operating efficiency (fees/tvl) for different timeframes."""
-    con = duckdb.connect(":memory:")
-    
-    # Save JSON data to temporary files
-    data_dir = Path("data")
-    protocols_file = data_dir / "protocols.json"
-    fees_file = data_dir / "fees.json"
-    
-    with open(protocols_file, "w") as f:
-        json.dump(data["protocols"], f)
-    with open(fees_file, "w") as f:
-        json.dump(data["fees"], f)
-    
-    # Create views
-    con.execute(f"""
-        CREATE VIEW protocols AS 
-        SELECT * FROM read_json_auto('{protocols_file}')
-    """)
-    
-    con.execute(f"""
-        CREATE VIEW fees AS 
+    # Unpivot the per-timeframe columns into rows so every timeframe is
+    # joined and divided in one pass, then keep the top 5 per timeframe
+    timeframe_columns = ", ".join(f"fees_{timeframe} AS '{timeframe}'" for timeframe in timeframes)
+    query = f"""
+        WITH fees_long AS (
+            SELECT id, name, timeframe, fees
+            FROM fees
+            UNPIVOT INCLUDE NULLS (fees FOR timeframe IN ({timeframe_columns}))
+        )
         SELECT 
-            unnest.id,
-            unnest.name,
-            unnest.total24h as fees_24h,
-            unnest.total7d as fees_7d,
-            unnest.total30d as fees_30d,
-            unnest.total1y as fees_1y,
-            unnest.totalAllTime as fees_all_time
-        FROM read_json_auto('{fees_file}') as f,
-        UNNEST(f.protocols) as unnest
-    """)
-    
-    results = {}
-    for timeframe in timeframes:
-        # Calculate efficiency metrics
-        query = f"""
-            WITH efficiency_data AS (
-                SELECT 
-                    f.name as protocol_name,
-                    p.category,
-                    p.chain,
-                    p.tvl,
-                    f.fees_{timeframe} as fees,
-                    CASE 
-                        WHEN p.tvl > 0 THEN f.fees_{timeframe} / p.tvl 
-                        ELSE 0 
-                    END as efficiency_ratio
-                FROM fees f
-                INNER JOIN protocols p ON f.id = p.id
-                WHERE p.tvl > 0  -- Exclude protocols with no TVL
-            )
-            SELECT 
-                protocol_name,
-                category,
-                chain,
-                tvl,
-                fees,
-                efficiency_ratio
-            FROM efficiency_data
-            ORDER BY efficiency_ratio DESC
-            LIMIT 5
-        """
-        
-        results[timeframe] = con.execute(query).fetchdf()
-    
-    # Clean up
-    protocols_file.unlink()
-    fees_file.unlink()
-    con.close()
+            f.timeframe,
+            f.name as protocol_name,
+            p.category,
+            p.chain,
+            p.tvl,
+            f.fees,
+            f.fees / p.tvl as efficiency_ratio
+        FROM fees_long f
+        INNER JOIN protocols p ON f.id = p.id
+        WHERE p.tvl > 0  -- Exclude protocols with no TVL
+        QUALIFY row_number() OVER (PARTITION BY f.timeframe ORDER BY efficiency_ratio DESC) <= 5
+        ORDER BY f.timeframe, efficiency_ratio DESC
+    """
+    
+    table = con.sql(query).to_arrow_table()
+    results = {
+        timeframe: table.filter(pc.equal(table["timeframe"], timeframe)).drop_columns("timeframe")
+        for timeframe in timeframes
+    }
     
     return results
 
@@ -82,8 +42,8 @@ def print_efficiency_results(results: Dict[str, Any]):
     print("\nTop 5 Protocols by Operating Efficiency (Fees/TVL)")
     print("=" * 80)
     
-    for timeframe, df in results.items():
+    for timeframe, table in results.items():
         print(f"\nTimeframe: {timeframe}")
         print("-" * 80)
-        print(df.to_string(index=False))
+        print_table(table)
         print("-" * 80) 
\ No newline at end of file
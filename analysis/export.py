@@ -0,0 +1,47 @@
+import duckdb
+from pathlib import Path
+
+def export_joined_data(con: duckdb.DuckDBPyConnection, output_file: str = "data/joined_data.csv") -> Path:
+    """Export protocols joined with their fees and revenue to a CSV or Parquet file.
+    
+    The format follows the file suffix: ``.parquet`` writes ZSTD-compressed
+    Parquet, anything else writes CSV with a header row.
+    """
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_path.suffix.lower() == ".parquet":
+        copy_options = "FORMAT PARQUET, COMPRESSION ZSTD"
+    else:
+        copy_options = "FORMAT CSV, HEADER"
+    
+    # COPY takes the destination as a SQL string literal
+    quoted_path = str(output_path).replace("'", "''")
+    
+    # Stream the join straight into the writer; no intermediate table
+    con.execute(f"""
+        COPY (
+            SELECT 
+                p.id,
+                p.name,
+                p.category,
+                p.chain,
+                p.tvl,
+                p.mcap,
+                f.fees_24h,
+                f.fees_7d,
+                f.fees_30d,
+                f.fees_1y,
+                f.fees_all_time,
+                r.revenue_24h,
+                r.revenue_7d,
+                r.revenue_30d,
+                r.revenue_1y,
+                r.revenue_all_time
+            FROM protocols p
+            INNER JOIN fees f ON f.id = p.id
+            LEFT JOIN revenue r ON r.id = p.id
+            ORDER BY p.id
+        ) TO '{quoted_path}' ({copy_options})
+    """)
+    
+    return output_path
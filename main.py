@@ -1,6 +1,13 @@
+import argparse
+import asyncio
 import httpx
+import orjson
+import os
+import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+from analysis._ctx import open_con, close_con
+from analysis.export import export_joined_data
 from analysis.efficiency import analyze_efficiency, print_efficiency_results
 from analysis.valuation import analyze_valuation, print_valuation_results
 
@@ -11,43 +18,151 @@ ENDPOINTS = {
     "revenue": "https://api.llama.fi/overview/fees?excludeTotalDataChart=true&excludeTotalDataChartBreakdown=true&dataType=dailyRevenue"
 }
 
-def fetch_endpoint_data(url: str) -> dict:
-    """Fetch data from an endpoint and return the response."""
-    with httpx.Client() as client:
-        response = client.get(url)
-        response.raise_for_status()
-        return response.json()
+# Raw response bodies and their validators, reused for conditional GETs
+CACHE_DIR = Path("data") / ".httpcache"
+# Cached bodies younger than this are served without contacting the server
+CACHE_MAX_AGE = 3600
 
-def prepare_data_for_analysis():
+# How fetch_endpoint_data obtained a body, as reported to the user
+FETCH_MESSAGES = {
+    "cached": "Using cached data for {name}",
+    "not_modified": "Revalidated cached data for {name}",
+    "downloaded": "Successfully fetched data for {name}",
+}
+
+def _replace_file(path: Path, content: bytes):
+    """Write a file via a temporary sibling so readers never see a partial write."""
+    tmp_file = path.with_name(path.name + ".tmp")
+    tmp_file.write_bytes(content)
+    os.replace(tmp_file, path)
+
+def _write_cache_meta(meta_file: Path, url: str, response: httpx.Response, previous: Dict[str, Any]):
+    """Record the validators and fetch time of a cached response.
+    
+    Validators the response doesn't carry (e.g. on a 304 that omits them)
+    are kept from the previous metadata.
+    """
+    _replace_file(meta_file, orjson.dumps({
+        "url": url,
+        "etag": response.headers.get("etag", previous.get("etag")),
+        "last_modified": response.headers.get("last-modified", previous.get("last_modified")),
+        "fetched_at": time.time(),
+    }))
+
+async def fetch_endpoint_data(client: httpx.AsyncClient, name: str, url: str, max_age: float = CACHE_MAX_AGE) -> Tuple[Path, str]:
+    """Fetch an endpoint into the on-disk cache.
+    
+    Returns the cached body's path and how it was obtained: "cached" (fresh,
+    no request sent), "not_modified" (revalidated with a 304) or "downloaded".
+    """
+    body_file = CACHE_DIR / f"{name}.json"
+    meta_file = CACHE_DIR / f"{name}.meta.json"
+    
+    meta = {}
+    headers = {}
+    if body_file.exists() and meta_file.exists():
+        try:
+            meta = orjson.loads(meta_file.read_bytes())
+        except orjson.JSONDecodeError:
+            # Unreadable metadata (e.g. an interrupted write); refetch in full
+            meta = {}
+        if meta.get("url") != url:
+            # Endpoint definition changed; the cached body is for another URL
+            meta = {}
+        elif time.time() - meta.get("fetched_at", 0) < max_age:
+            return body_file, "cached"
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    
+    response = await client.get(url, headers=headers)
+    if response.status_code == 304:
+        # Unchanged on the server; serve the cached body and restart its max age
+        _write_cache_meta(meta_file, url, response, meta)
+        return body_file, "not_modified"
+    response.raise_for_status()
+    
+    # Body first, meta last: the validators only ever describe a complete body
+    _replace_file(body_file, response.content)
+    _write_cache_meta(meta_file, url, response, {})
+    return body_file, "downloaded"
+
+async def fetch_all_endpoints(max_age: float = CACHE_MAX_AGE) -> Dict[str, Any]:
+    """Fetch all endpoints concurrently over one HTTP/2 client."""
+    async with httpx.AsyncClient(http2=True, timeout=60) as client:
+        results = await asyncio.gather(
+            *(fetch_endpoint_data(client, name, url, max_age) for name, url in ENDPOINTS.items()),
+            return_exceptions=True,
+        )
+    return dict(zip(ENDPOINTS, results))
+
+def prepare_data_for_analysis(max_age: float = CACHE_MAX_AGE):
     """Fetch and prepare data for analysis."""
     # Create data directory if it doesn't exist
     data_dir = Path("data")
     data_dir.mkdir(exist_ok=True)
+    CACHE_DIR.mkdir(exist_ok=True)
     
     # Fetch data from all endpoints
-    data = {}
-    for endpoint_name, url in ENDPOINTS.items():
-        try:
-            data[endpoint_name] = fetch_endpoint_data(url)
-            print(f"Successfully fetched data for {endpoint_name}")
-        except Exception as e:
-            print(f"Error fetching {endpoint_name}: {str(e)}")
+    payload_files = {}
+    for endpoint_name, result in asyncio.run(fetch_all_endpoints(max_age)).items():
+        if isinstance(result, Exception):
+            print(f"Error fetching {endpoint_name}: {str(result)}")
             return None
+        payload_files[endpoint_name], source = result
+        print(FETCH_MESSAGES[source].format(name=endpoint_name))
     
-    return data
+    return payload_files
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description="Crypto protocol efficiency and valuation analysis")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["analyze", "export"],
+        default="analyze",
+        help="print the efficiency/valuation rankings (default) or export the joined data",
+    )
+    parser.add_argument(
+        "--output",
+        default="data/joined_data.csv",
+        help="destination file for the export command (.parquet writes Parquet, otherwise CSV)",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=CACHE_MAX_AGE,
+        help="seconds a cached API response is reused without revalidating (0 always revalidates)",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     # Fetch and prepare data
-    data = prepare_data_for_analysis()
-    if data:
-        # Analyze operating efficiency
-        efficiency_results = analyze_efficiency(data)
-        print_efficiency_results(efficiency_results)
+    payload_files = prepare_data_for_analysis(args.max_age)
+    if payload_files:
+        # Load the cached payloads into DuckDB once (skipping any that are
+        # unchanged since the last run) and share them across analyses
+        con = open_con(payload_files)
         
-        # Analyze valuation metrics
-        valuation_results = analyze_valuation(data)
-        print_valuation_results(valuation_results)
+        # Always release the database file, even if an analysis fails
+        try:
+            if args.command == "export":
+                output_file = export_joined_data(con, args.output)
+                print(f"Exported joined data to {output_file}")
+            else:
+                # Analyze operating efficiency
+                efficiency_results = analyze_efficiency(con)
+                print_efficiency_results(efficiency_results)
+                
+                # Analyze valuation metrics
+                valuation_results = analyze_valuation(con)
+                print_valuation_results(valuation_results)
+        finally:
+            close_con()
 
 if __name__ == "__main__":
     main()
-
@@ -1,44 +1,90 @@
+import asyncio
 import httpx
+import orjson
 from pathlib import Path
-import json
-from typing import Any, Dict
-from collections import defaultdict
+from typing import Any, Dict, List, Optional
 
-def fetch_endpoint_data(url: str) -> dict:
+# Number of list items inspected per list, spread evenly across it
+LIST_SAMPLE_SIZE = 8
+
+# Each JSON value type gets one bit, so a field's observed types are a
+# single int and merging them is a bitwise OR
+TYPE_BITS = {
+    dict: 1,
+    list: 2,
+    str: 4,
+    int: 8,
+    float: 16,
+    bool: 32,
+    type(None): 64,
+}
+OTHER_TYPE_BIT = 128
+
+def type_names(mask: int) -> List[str]:
+    """Expand a type bitmask into the type names it contains."""
+    names = [t.__name__ for t, bit in TYPE_BITS.items() if mask & bit]
+    if mask & OTHER_TYPE_BIT:
+        names.append("other")
+    return names
+
+async def fetch_endpoint_data(client: httpx.AsyncClient, url: str) -> dict:
     """Fetch data from an endpoint and return the response."""
-    with httpx.Client() as client:
-        response = client.get(url)
-        response.raise_for_status()
-        return response.json()
+    response = await client.get(url)
+    response.raise_for_status()
+    return orjson.loads(response.content)
 
-def analyze_schema(data: Any, path: str = "") -> Dict[str, set]:
-    """Analyze the schema of the data and return a dictionary of field types."""
-    schema = defaultdict(set)
+def analyze_schema(data: Any, path: str = "", schema: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Analyze the schema of the data and return a dictionary of field type bitmasks."""
+    if schema is None:
+        schema = {}
     
-    if isinstance(data, dict):
-        for key, value in data.items():
-            current_path = f"{path}.{key}" if path else key
-            schema[current_path].add(type(value).__name__)
-            if isinstance(value, (dict, list)):
-                nested_schema = analyze_schema(value, current_path)
-                for k, v in nested_schema.items():
-                    schema[k].update(v)
-    elif isinstance(data, list) and data:
-        # Analyze first item in list as representative
-        nested_schema = analyze_schema(data[0], path)
-        for k, v in nested_schema.items():
-            schema[k].update(v)
+    # Walk with an explicit stack, adding every field into the one schema
+    stack = [(data, path)]
+    while stack:
+        node, node_path = stack.pop()
+        # Decoded JSON only contains builtin types, so exact type checks are
+        # enough and cheaper than isinstance
+        node_type = type(node)
+        if node_type is dict:
+            for key, value in node.items():
+                current_path = f"{node_path}.{key}" if node_path else key
+                value_type = type(value)
+                bit = TYPE_BITS.get(value_type, OTHER_TYPE_BIT)
+                schema[current_path] = schema.get(current_path, 0) | bit
+                if value_type is dict or value_type is list:
+                    stack.append((value, current_path))
+        elif node_type is list and node:
+            # Analyze a few items spread evenly from the first to the last,
+            # so fields that only some items carry are still picked up
+            last = len(node) - 1
+            if last < LIST_SAMPLE_SIZE:
+                indices = range(len(node))
+            elif LIST_SAMPLE_SIZE == 1:
+                # A single sample has no spread; inspect the first item only
+                indices = [0]
+            else:
+                indices = sorted({round(i * last / (LIST_SAMPLE_SIZE - 1)) for i in range(LIST_SAMPLE_SIZE)})
+            for index in indices:
+                stack.append((node[index], node_path))
     
     return schema
 
-def analyze_endpoints(endpoints: Dict[str, str]) -> Dict[str, Dict[str, list]]:
-    """Analyze schema for all provided endpoints."""
-    all_schemas = {}
+async def analyze_endpoints_async(endpoints: Dict[str, str]) -> Dict[str, Dict[str, list]]:
+    """Fetch all endpoints concurrently, then analyze the schema of each."""
+    # One pooled client; the endpoints are independent so fetch them together
+    async with httpx.AsyncClient(http2=True, timeout=60) as client:
+        results = await asyncio.gather(
+            *(fetch_endpoint_data(client, url) for url in endpoints.values()),
+            return_exceptions=True,
+        )
     
-    for endpoint_name, url in endpoints.items():
+    all_schemas = {}
+    for endpoint_name, data in zip(endpoints, results):
+        if isinstance(data, Exception):
+            print(f"Error analyzing {endpoint_name}: {str(data)}")
+            continue
+        
         try:
-            data = fetch_endpoint_data(url)
-            
             # Print detailed structure for debugging
             print(f"\nAnalyzing {endpoint_name}:")
             if isinstance(data, dict) and "protocols" in data:
@@ -48,8 +94,8 @@ def analyze_endpoints(endpoints: Dict[str, str]) -> Dict[str, Dict[str, list]]:
             
             schema = analyze_schema(data)
             
-            # Convert sets to lists for JSON serialization
-            schema_dict = {k: list(v) for k, v in schema.items()}
+            # Expand type bitmasks to lists of names for JSON serialization
+            schema_dict = {k: type_names(v) for k, v in schema.items()}
             all_schemas[endpoint_name] = schema_dict
             
             print(f"Successfully analyzed schema for {endpoint_name}")
@@ -59,14 +105,18 @@ def analyze_endpoints(endpoints: Dict[str, str]) -> Dict[str, Dict[str, list]]:
     
     return all_schemas
 
+def analyze_endpoints(endpoints: Dict[str, str]) -> Dict[str, Dict[str, list]]:
+    """Analyze schema for all provided endpoints."""
+    return asyncio.run(analyze_endpoints_async(endpoints))
+
 def save_schemas(schemas: Dict[str, Dict[str, list]], output_dir: str = "data") -> Path:
     """Save schema information to a JSON file."""
     data_dir = Path(output_dir)
     data_dir.mkdir(exist_ok=True)
     
     schema_file = data_dir / "schemas.json"
-    with open(schema_file, "w") as f:
-        json.dump(schemas, f, indent=2)
+    with open(schema_file, "wb") as f:
+        f.write(orjson.dumps(schemas, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
     
     return schema_file
 